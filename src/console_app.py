@@ -3,47 +3,66 @@ from math import ceil
 from simulator import (
     Task,
     resource_ids,
+    register_names,
     generate_tasks,
     BadScheduleException,
     simulate_cpu,
 )
 
 
+# a task's cell in every line of its row, formatted in one go
+_card_template: str = (
+    " task {0:<3} |\n"
+    " {1:<8} |\n"
+    " {2} cycles |\n"
+    " regs: {3:<2} |\n"
+    " reqs: {4:<2} |\n"
+    "-----------"
+)
+
+
 def display_tasks(
     cursor: dict[str, int], output: list[str], width: int, tasklist: list[Task]
 ) -> None:
     cols: int = (width - 1) // 11
-    for row in range(ceil(len(tasklist) / cols)):
+    rows: int = ceil(len(tasklist) / cols)
+    # collect each line's pieces and join them once, appending to a list entry
+    # with += would copy the whole line for every card
+    fragments: list[list[str]] = [[] for _ in range(6 * rows)]
+    for row in range(rows):
         for col in range(cols):
             if row * cols + col >= len(tasklist):
                 break
             y = row * 6
             task = tasklist[row * cols + col]
-            output[y + 0] += f" task {task.id.ljust(3)} |"
-            output[y + 1] += f" {task.type.value.ljust(8)} |"
-            output[y + 2] += f" {task.duration} cycles |"
-            output[
-                y + 3
-            ] += f" regs: {' '.join(r.value for r in task.registers).ljust(2)} |"
-            output[
-                y + 4
-            ] += f" reqs: {' '.join(t.id for t  in task.depends).ljust(2)} |"
-            output[y + 5] += f"-----------"
-    cursor["y"] = ceil(len(tasklist) / cols) * 6
+            card = _card_template.format(
+                task.id,
+                task.type.value,
+                task.duration,
+                register_names[task.reg_mask],
+                " ".join(t.id for t in task.depends),
+            )
+            for k, line in enumerate(card.split("\n")):
+                fragments[y + k].append(line)
+    for i, line in enumerate(fragments):
+        output[i] += "".join(line)
+    cursor["y"] = rows * 6
 
 
 def parse_responses(
     responses: list[str], tasklist: list[Task]
-) -> dict[str, list[Task]]:
+) -> tuple[dict[str, int], dict[str, list[Task]]]:
+    schedule: dict[str, int] = {}
     parsed: dict[str, list[Task]] = {name: [] for name in resource_ids}
+    by_id: dict[str, Task] = {t.id: t for t in tasklist}
     for i, line in enumerate(responses):
         channel = parsed[resource_ids[i]]
         for item in line.split():
             temp = item.split(":", 2)
-            task = next(x for x in tasklist if x.id == temp[1])
-            task.scheduled = int(temp[0])
+            task = by_id[temp[1]]
+            schedule[task.id] = int(temp[0])
             channel.append(task)
-    return parsed
+    return (schedule, parsed)
 
 
 def start_terminal() -> None:
@@ -92,8 +111,8 @@ def start_terminal() -> None:
 
         # simulate / verify the input
         try:
-            solution = parse_responses(responses, tasklist)
-            simulate_cpu(solution, tasklist)
+            (schedule, solution) = parse_responses(responses, tasklist)
+            simulate_cpu(solution, tasklist, schedule)
         # report back any conflict
         except BadScheduleException as e:
             errs = e.args[0]
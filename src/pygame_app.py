@@ -1,16 +1,49 @@
 from typing import Callable, Protocol
+import bisect
+import functools
 from simulator import (
     Task,
     ResourceType,
+    register_names,
     generate_tasks,
     BadScheduleException,
     simulate_cpu,
 )
 import pygame
 
+_background_color: pygame.Color = pygame.Color(177, 209, 252)
+# fill and outline colors of each resource's tasks on the fret boards
+_resource_colors: dict[ResourceType, tuple[pygame.Color, pygame.Color]] = {
+    t: (pygame.Color(t.value), pygame.Color(t.value).lerp(pygame.Color("Black"), 0.2))
+    for t in ResourceType
+}
+
+
+class MouseState:
+    """
+    The mouse as sampled once at the start of a frame
+    """
+
+    pos: tuple[int, int]
+    pressed: tuple[bool, bool, bool]
+
+    def __init__(self, pos: tuple[int, int], pressed: tuple[bool, bool, bool]) -> None:
+        self.pos = pos
+        self.pressed = pressed
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, MouseState):
+            return NotImplemented
+        return self.pos == other.pos and self.pressed == other.pressed
+
 
 class State(Protocol):
-    def tick(self) -> None:
+    surface: pygame.Surface
+
+    def tick(self, mouse: MouseState) -> list[pygame.Rect]:
+        """
+        Returns the regions of the surface which were redrawn this frame
+        """
         ...
 
     def update_parent(self, parent: "MainStateMachine | None") -> None:
@@ -24,8 +57,13 @@ class MainStateMachine:
         initial.update_parent(self)
         self.current_state = initial
 
-    def tick(self) -> None:
-        self.current_state.tick()
+    def tick(self, mouse: MouseState) -> list[pygame.Rect]:
+        state = self.current_state
+        dirty = state.tick(mouse)
+        if self.current_state is not state:
+            # the new state may have already drawn over the whole surface
+            return [self.current_state.surface.get_rect()]
+        return dirty
 
     def swap_state(self, new_state: State) -> State:
         tmp, self.current_state = self.current_state, new_state
@@ -34,14 +72,31 @@ class MainStateMachine:
         return tmp
 
 
-class Text:
-    _font: pygame.font.Font | None = None
+# the font shared by all text, opened once per process, see Text.font
+_font: pygame.font.Font | None = None
 
+
+class Text:
     @staticmethod
     def font() -> pygame.font.Font:
-        if not Text._font:
-            Text._font = pygame.font.Font(pygame.font.get_default_font(), 16)
-        return Text._font
+        global _font
+        if _font is None:
+            _font = pygame.font.Font(pygame.font.get_default_font(), 16)
+            # surfaces rendered with an older font are stale
+            Text.clear_cache()
+        return _font
+
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def render_cached(text: str, color: str, antialias: bool = True) -> pygame.Surface:
+        """
+        Labels repeat from frame to frame, so each one is only rendered once
+        """
+        return Text.font().render(text, antialias, color)
+
+    @staticmethod
+    def clear_cache() -> None:
+        Text.render_cached.cache_clear()
 
     @staticmethod
     def get_size(text: str) -> tuple[int, int]:
@@ -55,7 +110,7 @@ class Text:
         *,
         centered: bool = True,
     ) -> None:
-        result = Text.font().render(text, True, "Black")
+        result = Text.render_cached(text, "Black")
         (width, height) = result.get_size()
         rect = (
             pygame.Rect(
@@ -67,33 +122,46 @@ class Text:
         surface.blit(result, rect)
 
 
-def click_behavior(region: pygame.Rect) -> tuple[bool, bool]:
-    hovered: bool = region.collidepoint(pygame.mouse.get_pos())
+def click_behavior(
+    region: pygame.Rect,
+    mouse: MouseState,
+) -> tuple[bool, bool]:
+    hovered: bool = region.collidepoint(mouse.pos)
     return (
         hovered,
-        hovered and pygame.mouse.get_pressed()[0],
+        hovered and mouse.pressed[0],
     )
 
 
+@functools.lru_cache(maxsize=32)
+def _render_button(
+    size: tuple[int, int], text: str, hovered: bool, clicked: bool
+) -> pygame.Surface:
+    """
+    Buttons only have a few looks each, so every one is composed once
+    """
+    button = pygame.surface.Surface(size)
+    button.fill(_background_color)
+    color: str = "Green" if clicked else "Gray"
+    pygame.draw.rect(button, color, button.get_rect(), 0, 7)
+    if hovered:
+        pygame.draw.rect(button, "Black", button.get_rect(), 2, 7)
+    (width, height) = size
+    Text(button, text, (width / 2, height / 2))
+    return button
+
+
 class Button:
     def __init__(
         self,
         surface: pygame.Surface,
         region: pygame.Rect,
         text: str,
+        mouse: MouseState,
         callback: Callable[[], None] | None = None,
     ) -> None:
-        (hovered, clicked) = click_behavior(region)
-
-        button = pygame.surface.Surface(region.size)
-        button.fill(pygame.Color(177, 209, 252))
-        color: str = "Green" if clicked else "Gray"
-        pygame.draw.rect(button, color, button.get_rect(), 0, 7)
-        if hovered:
-            pygame.draw.rect(button, "Black", button.get_rect(), 2, 7)
-        (width, height) = region.size
-        Text(button, text, (width / 2, height / 2))
-        surface.blit(button, region)
+        (hovered, clicked) = click_behavior(region, mouse)
+        surface.blit(_render_button(region.size, text, hovered, clicked), region)
 
         if clicked and callback:
             callback()
@@ -102,23 +170,32 @@ class Button:
 class MainMenu(State):
     surface: pygame.Surface
     parent: MainStateMachine | None
+    _drawn: bool
+    _mouse_previous: MouseState | None
 
     def __init__(self, surface: pygame.Surface) -> None:
         self.surface = surface
-        surface.fill(pygame.Color(177, 209, 252))
+        self._drawn = False
+        self._mouse_previous = None
+        surface.fill(_background_color)
 
     def update_parent(self, parent: MainStateMachine | None) -> None:
         self.parent = parent
 
-    def tick(self) -> None:
+    def tick(self, mouse: MouseState) -> list[pygame.Rect]:
+        # the menu only changes with the mouse
+        if self._drawn and mouse == self._mouse_previous:
+            return []
+        self._mouse_previous = mouse
         (width, height) = self.surface.get_size()
-        Text(self.surface, "Scheduling", (width / 2, 40.0))
-        Button(
-            self.surface,
-            pygame.Rect((width / 2 - 100, height / 2), (200, 50)),
-            "Play",
-            self.swap_menu,
-        )
+        region = pygame.Rect((width / 2 - 100, height / 2), (200, 50))
+        dirty = [region]
+        if not self._drawn:
+            Text(self.surface, "Scheduling", (width / 2, 40.0))
+            dirty.append(self.surface.get_rect())
+            self._drawn = True
+        Button(self.surface, region, "Play", mouse, self.swap_menu)
+        return dirty
 
     def swap_menu(self) -> None:
         if not self.parent:
@@ -127,58 +204,103 @@ class MainMenu(State):
 
 
 class TaskCard:
+    __slots__ = (
+        "task",
+        "_text",
+        "line_height",
+        "region",
+        "visible",
+        "parent",
+        "_surface",
+    )
+
     task: Task
-    text: list[str]
+    _text: tuple[str, ...]
     line_height: int
     region: pygame.Rect
     visible: bool
     parent: "GameScene"
+    _surface: pygame.Surface
 
     def __init__(
         self, task: Task, coords: tuple[int, int], parent: "GameScene"
     ) -> None:
         self.task = task
-        self.text = [
-            f"Task {task.id}",
-            f"{task.type.value}",
-            f"{task.duration} cycles",
-            f"reg {' '.join([r.value for r in task.registers])}",
-            f"dep {' '.join([t.id for t in task.depends])}" if task.depends else "",
-        ]
         self.line_height = Text.font().get_linesize()
         self.region = pygame.Rect(coords, (85, 5 * self.line_height))
         self.parent = parent
         self.visible = True
+        self.text = task.display_lines
 
         self.parent.register_click(
-            lambda p: self if self.visible and self.region.collidepoint(p) else None
+            self.region, lambda p: self if self.visible else None
         )
 
         self.parent.register_drag(self.set_pos)
 
+    @property
+    def text(self) -> tuple[str, ...]:
+        return self._text
+
+    @text.setter
+    def text(self, text: list[str] | tuple[str, ...]) -> None:
+        # stored as a tuple so the card can only change through this setter
+        self._text = tuple(text)
+        self._rebuild()
+        self.parent.mark_dirty(self.bounds())
+
     def set_pos(self, pos: tuple[int, int]) -> None:
         if self.parent.currently_selected == self:
+            old = self.bounds()
             self.region.center = pos
-
-    def draw(self, surface: pygame.Surface) -> None:
-        if not self.visible:
-            return
+            self.parent.mark_dirty(old.union(self.bounds()))
+
+    def bounds(self) -> pygame.Rect:
+        """
+        The area of the screen covered by the card when drawn
+        """
+        return pygame.Rect(self.region.topleft, self._surface.get_size())
+
+    def _rebuild(self) -> None:
+        """
+        Renders the card once, the `text` setter calls this again on change
+        """
         card = pygame.Rect(0, 0, self.region.width + 10, self.region.height + 10)
-        task_card = pygame.Surface(card.size)
-        task_card.fill(pygame.Color(177, 209, 252))
-        pygame.draw.rect(task_card, self.task.type.value, card, 0, 5)
+        self._surface = pygame.Surface(card.size)
+        self._surface.fill(_background_color)
+        pygame.draw.rect(self._surface, self.task.type.value, card, 0, 5)
         for i, line in enumerate(self.text):
-            Text(task_card, line, (5, 5 + self.line_height * i), centered=False)
-        surface.blit(task_card, self.region.topleft)
+            Text(self._surface, line, (5, 5 + self.line_height * i), centered=False)
+
+    def draw(self, surface: pygame.Surface) -> None:
+        if self.visible:
+            surface.blit(self._surface, self.region.topleft)
 
 
 class FretBoard:
+    __slots__ = (
+        "parent",
+        "time_board",
+        "_starts",
+        "_card_by_task",
+        "region",
+        "dragging",
+        "resource_type",
+        "_background",
+        "_buffer",
+        "_stale",
+    )
+
     parent: "GameScene"
     time_board: list[Task]
-    captured_cards: set["TaskCard"]
+    _starts: list[int]
+    _card_by_task: dict[Task, "TaskCard"]
     region: pygame.Rect
     dragging: "TaskCard"
     resource_type: ResourceType
+    _background: pygame.Surface
+    _buffer: pygame.Surface
+    _stale: bool
 
     def __init__(
         self,
@@ -187,36 +309,55 @@ class FretBoard:
         size: tuple[int, int],
         resource: ResourceType,
     ) -> None:
+        # time_board is kept sorted, _starts holds the scheduled time of each entry
         self.time_board = []
+        self._starts = []
         self.parent = parent
         self.region = pygame.Rect(
             coords[0] - size[0] // 2, coords[1] - size[1] // 2, size[0], size[1]
         )
         self.resource_type = resource
-        self.captured_cards = set()
+        self._card_by_task = {}
+
+        # the frame and grid never change, only the scheduled tasks are redrawn
+        self._background = pygame.surface.Surface(self.region.size)
+        (width, height) = self.region.size
+        self._background.fill(_background_color)
+        pygame.draw.rect(self._background, "Gray", self._background.get_rect(), 0, 5)
+        pygame.draw.line(
+            self._background,
+            self.resource_type.value,
+            (width // 2, 0),
+            (width // 2, height),
+            2,
+        )
+        for i in range(1, 20):
+            level = int((height / 20) * i)
+            pygame.draw.line(self._background, "Black", (0, level), (width, level))
+        # the composed board, only rebuilt after time_board changes
+        self._buffer = pygame.surface.Surface(self.region.size)
+        self._stale = True
+
         self.parent.register_drop(self.drop_object)
-        self.parent.register_click(self.grab_line)
+        self.parent.register_click(self.region, self.grab_line)
 
     def grab_line(self, pos: tuple[int, int]) -> "TaskCard | None":
-        if not self.region.collidepoint(pos):
-            return None
         time = int((pos[1] - self.region.top) / (self.region.height / 20))
-        item = next(
-            (
-                t
-                for t in self.time_board
-                if t.scheduled <= time < t.scheduled + t.duration
-            ),
-            None,
-        )
-        if not item:
+        i = bisect.bisect_right(self._starts, time) - 1
+        if i < 0 or time >= self._starts[i] + self.time_board[i].duration:
             return None
-        card = next(t for t in self.captured_cards if t.task == item)
-        self.time_board.remove(item)
-        self.captured_cards.remove(card)
+        item = self.time_board.pop(i)
+        del self._starts[i]
+        card = self._card_by_task.pop(item)
         card.visible = True
+        self._stale = True
+        self.parent.mark_dirty(self.region)
+        self.parent.mark_dirty(card.bounds())
         return card
 
+    def schedule(self) -> dict[str, int]:
+        return {t.id: start for (start, t) in zip(self._starts, self.time_board)}
+
     def drop_object(self, pos: tuple[int, int]) -> None:
         if not self.region.collidepoint(pos):
             return
@@ -231,45 +372,42 @@ class FretBoard:
         task = task_card.task
         time = int((pos[1] - self.region.top) / (self.region.height / 20))
 
-        i = 0
-        while i < len(self.time_board):
-            o_task = self.time_board[i]
-            if time + task.duration <= o_task.scheduled:
-                break
-            if time >= o_task.scheduled + o_task.duration:
-                i += 1
-                continue
-            else:
-                return None
+        # only the neighbours around the insertion point can overlap
+        i = bisect.bisect_left(self._starts, time)
+        if i > 0 and self._starts[i - 1] + self.time_board[i - 1].duration > time:
+            return None
+        if i < len(self._starts) and time + task.duration > self._starts[i]:
+            return None
 
         task_card.visible = False
-        self.captured_cards.add(task_card)
-        task.scheduled = time
+        self._card_by_task[task] = task_card
         self.time_board.insert(i, task)
+        self._starts.insert(i, time)
+        self._stale = True
+        self.parent.mark_dirty(self.region)
+        self.parent.mark_dirty(task_card.bounds())
 
     def draw(self, surface: pygame.Surface) -> None:
-        buffer = pygame.surface.Surface(self.region.size)
+        if self._stale:
+            self._compose()
+        surface.blit(self._buffer, self.region.topleft)
+
+    def _compose(self) -> None:
+        buffer = self._buffer
+        buffer.blit(self._background, (0, 0))
         (width, height) = self.region.size
-        buffer.fill(pygame.Color(177, 209, 252))
-        pygame.draw.rect(buffer, "Gray", buffer.get_rect(), 0, 5)
-        pygame.draw.line(
-            buffer, self.resource_type.value, (width // 2, 0), (width // 2, height), 2
-        )
-        for i in range(1, 20):
-            level = int((height / 20) * i)
-            pygame.draw.line(buffer, "Black", (0, level), (width, level))
-        for task in self.time_board:
-            lo = task.scheduled * (height / 20)
+        for scheduled, task in zip(self._starts, self.time_board):
+            lo = scheduled * (height / 20)
             y_size = task.duration * (height / 20)
             rect = pygame.Rect((0, lo), (width, y_size))
-            pygame.draw.rect(buffer, task.type.value, rect, 0, 5)
-            dark = pygame.Color(task.type.value).lerp(pygame.Color("Black"), 0.2)
+            (bright, dark) = _resource_colors[task.type]
+            pygame.draw.rect(buffer, bright, rect, 0, 5)
             pygame.draw.rect(buffer, dark, rect, 2, 5)
-            text = f"{task.id} {' '.join(r.value for r in task.registers)}" + (
+            text = f"{task.id} {register_names[task.reg_mask]}" + (
                 f" <- {' '.join(t.id for t in task.depends)}" if task.depends else ""
             )
             Text(buffer, text, rect.center)
-        surface.blit(buffer, self.region.topleft)
+        self._stale = False
 
 
 class GameScene(State):
@@ -283,10 +421,12 @@ class GameScene(State):
     resources: dict[str, FretBoard]
     currently_selected: object | None
     errs: list[str]
+    _dirty: list[pygame.Rect]
 
-    mouse_previous: tuple[bool, bool, bool]
+    mouse_previous: MouseState
 
-    click_observers: list[Callable[[tuple[int, int]], object | None]]
+    _click_rects: list[pygame.Rect]
+    _click_handlers: list[Callable[[tuple[int, int]], object | None]]
     drag_observers: list[Callable[[tuple[int, int]], None]]
     drop_observers: list[Callable[[tuple[int, int]], None]]
 
@@ -306,10 +446,12 @@ class GameScene(State):
         self.cards = []
         self.currently_selected = None
         self.errs = []
+        self._dirty = [surface.get_rect()]
 
-        self.mouse_previous = (False, False, False)
+        self.mouse_previous = MouseState((0, 0), (False, False, False))
 
-        self.click_observers = []
+        self._click_rects = []
+        self._click_handlers = []
         self.drag_observers = []
         self.drop_observers = []
 
@@ -324,10 +466,16 @@ class GameScene(State):
         }
 
     def register_click(
-        self, callback: Callable[[tuple[int, int]], object | None]
+        self,
+        region: pygame.Rect,
+        callback: Callable[[tuple[int, int]], object | None],
     ) -> int:
-        self.click_observers.append(callback)
-        return len(self.click_observers) - 1
+        """
+        `callback` only runs for clicks inside `region`, which is tracked by reference
+        """
+        self._click_rects.append(region)
+        self._click_handlers.append(callback)
+        return len(self._click_handlers) - 1
 
     def register_drag(self, callback: Callable[[tuple[int, int]], None]) -> int:
         self.drag_observers.append(callback)
@@ -337,6 +485,12 @@ class GameScene(State):
         self.drop_observers.append(callback)
         return len(self.drop_observers) - 1
 
+    def mark_dirty(self, region: pygame.Rect) -> None:
+        """
+        Schedules `region` to be repainted on the next tick
+        """
+        self._dirty.append(region.copy())
+
     def update_parent(self, parent: MainStateMachine | None) -> None:
         self.parent = parent
 
@@ -345,14 +499,19 @@ class GameScene(State):
         for card in self.cards:
             card.region.topleft = (last_x, 10)
             last_x += card.region.width + 20
+        self.mark_dirty(self.surface.get_rect())
 
     def submit_solution(self) -> None:
         solution = {name: r.time_board for (name, r) in self.resources.items()}
+        schedule: dict[str, int] = {}
+        for board in self.resources.values():
+            schedule.update(board.schedule())
         try:
-            simulate_cpu(solution, self.task_list)
+            simulate_cpu(solution, self.task_list, schedule)
             self.completed = True
         except BadScheduleException as e:
             self.errs = e.args[0].splitlines()
+        self.mark_dirty(self.surface.get_rect())
 
     def state_menu(self) -> None:
         if not self.parent:
@@ -361,64 +520,102 @@ class GameScene(State):
             )
         self.parent.swap_state(MainMenu(self.surface))
 
-    def tick(self) -> None:
-        self.surface.fill(pygame.Color(177, 209, 252))
-        mouse = pygame.mouse.get_pressed()
-        mouse_pos = pygame.mouse.get_pos()
+    def tick(self, mouse: MouseState) -> list[pygame.Rect]:
+        # with nothing to repaint and the mouse unchanged there is nothing to do,
+        # unless a card is selected, since it follows the mouse while held
+        if (
+            not self._dirty
+            and self.currently_selected is None
+            and mouse == self.mouse_previous
+        ):
+            return []
 
         if self.completed:
-            Text(self.surface, "Congrats, you completed the puzzle!", (540, 600))
+            dirty, self._dirty = self._dirty, []
+            if dirty:
+                self.surface.fill(_background_color)
+                Text(self.surface, "Congrats, you completed the puzzle!", (540, 600))
             rect = pygame.Rect(0, 0, 200, 40)
             rect.center = (540, 400)
-            Button(self.surface, rect, "Play Again", self.state_menu)
-            return
+            Button(self.surface, rect, "Play Again", mouse, self.state_menu)
+            self.mouse_previous = mouse
+            return dirty + [rect]
 
-        if not self.mouse_previous[0] and mouse[0]:
+        if not self.mouse_previous.pressed[0] and mouse.pressed[0]:
             # user is clicking
             selected: object | None = None
-            for observer in self.click_observers:
-                tmp = observer(mouse_pos)
+            # pygame finds every rect under the cursor in a single call
+            hits = pygame.Rect(mouse.pos, (1, 1)).collidelistall(self._click_rects)
+            for i in hits:
+                tmp = self._click_handlers[i](mouse.pos)
                 if not selected and tmp:
                     selected = tmp
             self.currently_selected = selected
-        elif self.mouse_previous[0] and mouse[0]:
+        elif self.mouse_previous.pressed[0] and mouse.pressed[0]:
             # User is dragging
             for observer in self.drag_observers:
-                observer(mouse_pos)
-        elif self.mouse_previous[0] and not mouse[0]:
+                observer(mouse.pos)
+        elif self.mouse_previous.pressed[0] and not mouse.pressed[0]:
             # user is dropping
             for observer in self.drop_observers:
-                observer(mouse_pos)
+                observer(mouse.pos)
             self.currently_selected = None
 
-        for color, board in self.resources.items():
-            board.draw(self.surface)
-        for card in self.cards:
-            card.draw(self.surface)
-        for i, line in enumerate(self.errs):
-            Text(self.surface, line, (10, 120 + 16 * i), centered=False)
-        Button(self.surface, pygame.Rect(990, 10, 80, 20), "Reset", self.reset_card_pos)
-        Button(
-            self.surface, pygame.Rect(990, 660, 80, 40), "Submit", self.submit_solution
-        )
+        # only repaint what changed, everything drawn is clipped to the dirty area
+        dirty, self._dirty = self._dirty, []
+        if dirty:
+            self.surface.set_clip(dirty[0].unionall(dirty[1:]))
+            self.surface.fill(_background_color)
+            for color, board in self.resources.items():
+                board.draw(self.surface)
+            for card in self.cards:
+                card.draw(self.surface)
+            for i, line in enumerate(self.errs):
+                Text(self.surface, line, (10, 120 + 16 * i), centered=False)
+            self.surface.set_clip(None)
+
+        # buttons are opaque and drawn on top, so they can always be redrawn in place
+        reset = pygame.Rect(990, 10, 80, 20)
+        submit = pygame.Rect(990, 660, 80, 40)
+        Button(self.surface, reset, "Reset", mouse, self.reset_card_pos)
+        Button(self.surface, submit, "Submit", mouse, self.submit_solution)
         self.mouse_previous = mouse
+        return dirty + [reset, submit]
 
 
 def start_pygame() -> None:
     pygame.init()
+    # open the font up front, every state reuses it
+    Text.font()
     screen = pygame.display.set_mode((1080, 720))
     clock = pygame.time.Clock()
     quit = False
     dt: float = 0
 
     game = MainStateMachine(MainMenu(screen))
+    idle = False
 
     while not quit:
-        for event in pygame.event.get():
+        events = pygame.event.get()
+        if idle and not events:
+            # nothing changes on screen without an event, so sleep until one arrives,
+            # the events woken on are handled below, an expose still repaints
+            events = [pygame.event.wait(), *pygame.event.get()]
+        exposed = False
+        for event in events:
             if event.type == pygame.QUIT:
                 quit = True
-
-        game.tick()
-
-        pygame.display.flip()
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                exposed = True
+
+        # read the mouse once per frame and hand the snapshot down
+        mouse = MouseState(pygame.mouse.get_pos(), pygame.mouse.get_pressed())
+        dirty = game.tick(mouse)
+        idle = not dirty
+        # the screen surface always holds the whole frame, so an exposed window
+        # gets all of it even on an idle frame, otherwise only the dirty rects
+        if exposed:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
         dt = clock.tick(60) / 1_000
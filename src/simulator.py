@@ -1,4 +1,6 @@
 from enum import Enum
+from itertools import chain, repeat
+import heapq
 import random as rand
 
 
@@ -9,6 +11,7 @@ class ResourceType(Enum):
 
 
 resource_ids: list[str] = [e.value for e in ResourceType]
+_resource_types: list[ResourceType] = list(ResourceType)
 
 
 class Register(Enum):
@@ -20,13 +23,28 @@ class Register(Enum):
     F = "F"
 
 
+# Tasks store their registers as a bitmask, one bit per register
+register_bits: dict[Register, int] = {r: 1 << i for (i, r) in enumerate(Register)}
+# display string for every possible register mask, e.g. "A C"
+register_names: list[str] = [
+    " ".join(r.value for (r, bit) in register_bits.items() if bit & mask)
+    for mask in range(1 << len(Register))
+]
+_register_masks: list[int] = list(register_bits.values())
+# a task has a second register 25% of the time, 0 stands for no second register
+_second_register_masks: list[int] = [0, *_register_masks]
+_second_register_weights: list[int] = [3 * len(Register), *(1 for _ in Register)]
+
+
 class Task:
+    __slots__ = ("id", "type", "depends", "duration", "reg_mask", "_display_lines")
+
     id: str
     type: ResourceType
     depends: set["Task"]
     duration: int
-    registers: set[Register]
-    scheduled: int
+    reg_mask: int
+    _display_lines: tuple[str, ...]
 
     def __init__(
         self,
@@ -34,20 +52,31 @@ class Task:
         type: ResourceType,
         duration: int,
         depends: set["Task"],
-        registers: set[Register],
+        reg_mask: int,
     ) -> None:
         self.id = id
         self.type = type
         self.duration = duration
         self.depends = depends
-        self.registers = registers
-        self.scheduled = -1
-
-
-def task_depth(task: Task) -> int:
-    if len(task.depends) == 0:
-        return 1
-    return 1 + max(task_depth(o) for o in task.depends)
+        self.reg_mask = reg_mask
+
+    @property
+    def display_lines(self) -> tuple[str, ...]:
+        """
+        The lines shown on this task's card, built on first use
+        Tasks are not modified once generated, so this is never invalidated
+        """
+        try:
+            return self._display_lines
+        except AttributeError:
+            self._display_lines = (
+                f"Task {self.id}",
+                f"{self.type.value}",
+                f"{self.duration} cycles",
+                f"reg {register_names[self.reg_mask]}",
+                f"dep {' '.join([t.id for t in self.depends])}" if self.depends else "",
+            )
+            return self._display_lines
 
 
 def generate_tasks(length: int) -> list[Task]:
@@ -55,27 +84,25 @@ def generate_tasks(length: int) -> list[Task]:
 
     # Generate blank tasks
     for i in range(1, length + 1):
-        lists.append(Task(str(i), ResourceType.Red, 1, set(), set()))
+        lists.append(Task(str(i), ResourceType.Red, 1, set(), 0))
 
     rand.shuffle(lists)
 
     # Populate them with tasks
     resource_weights = [rand.randint(4, 16) for _ in range(3)]
     sum_weights = sum(resource_weights)
-    resource_ratio = [weight / sum_weights for weight in resource_weights]
-    resource_tasks = [0, 0, 0]
-    for _ in range(length):
-        distance = [
-            target - n / length for (n, target) in zip(resource_tasks, resource_ratio)
-        ]
-        i = max(enumerate(distance), key=lambda t: t[1])[0]
+    # split the tasks in proportion to the weights, the tasks left over after
+    # rounding down go to the resources with the largest remainders
+    resource_tasks = [weight * length // sum_weights for weight in resource_weights]
+    by_remainder = sorted(
+        range(3), key=lambda i: resource_weights[i] * length % sum_weights, reverse=True
+    )
+    for i in by_remainder[: length - sum(resource_tasks)]:
         resource_tasks[i] += 1
 
     for resource, task in zip(
-        (
-            final_type
-            for (num, resc) in zip(resource_tasks, list(ResourceType))
-            for final_type in (resc for _ in range(num))
+        chain.from_iterable(
+            repeat(resc, num) for (num, resc) in zip(resource_tasks, _resource_types)
         ),
         lists,
     ):
@@ -84,38 +111,40 @@ def generate_tasks(length: int) -> list[Task]:
     rand.shuffle(lists)
 
     # add durations
-    for task in lists:
-        task.duration = rand.randrange(1, 5)
-
-    # add registers
-    for task in lists:
-        register_set = set()
-        register_set.add(rand.choice(list(Register)))
-        # second register
-        if rand.random() < 0.25:
-            # Slightly less than 25% (Due to chance of adding the same register twice)
-            register_set.add(rand.choice(list(Register)))
-        task.registers = register_set
+    for task, duration in zip(lists, rand.choices(range(1, 5), k=length)):
+        task.duration = duration
 
-    # add dependencies
+    # add registers, drawn for every task at once
+    firsts = rand.choices(_register_masks, k=length)
+    # second register
+    # Slightly less than 25% (Due to chance of adding the same register twice)
+    seconds = rand.choices(_second_register_masks, _second_register_weights, k=length)
+    for task, first, second in zip(lists, firsts, seconds):
+        task.reg_mask = first | second
 
+    # add dependencies
+    # tasks only depend on tasks before them, whose depth is final by then,
+    # so each task's depth is tracked here instead of walking its dependencies
+    depths = [1] * length
     for i in range(1, length):
         task = lists[i]
         # first dependency
         if rand.random() < 0.33:
             continue
 
-        depend = rand.choice(lists[:i])
-        if task_depth(depend) < 4:
-            task.depends.add(depend)
+        j = rand.randrange(i)
+        if depths[j] < 4:
+            task.depends.add(lists[j])
+            depths[i] = max(depths[i], depths[j] + 1)
 
         # second dependency
         if rand.random() < 0.66:
             continue
 
-        depend = rand.choice(lists[:i])
-        if task_depth(depend) < 4:
-            task.depends.add(depend)
+        j = rand.randrange(i)
+        if depths[j] < 4:
+            task.depends.add(lists[j])
+            depths[i] = max(depths[i], depths[j] + 1)
 
     rand.shuffle(lists)
 
@@ -129,22 +158,29 @@ class BadScheduleException(Exception):
 def accept_task(
     channel: str,
     solution: dict[str, list[Task]],
+    schedule: dict[str, int],
+    cursor: dict[str, int],
     time: int,
     running_tasks: dict[str, tuple[int, Task] | None],
     completed: set[Task],
-) -> None:
+    remaining_deps: dict[Task, int],
+    live_mask: int,
+    register_owner: dict[int, Task],
+) -> Task | None:
     """
+    Returns the task dispatched on `channel`, if any.
     This function throws BadScheduleException, which should be caught by the caller
     """
-    if len(solution[channel]) == 0:
+    if cursor[channel] == len(solution[channel]):
         return None
-    task = solution[channel][0]
-    if task.scheduled < time:
+    task = solution[channel][cursor[channel]]
+    scheduled = schedule[task.id]
+    if scheduled < time:
         raise BadScheduleException(
-            f"Schedule not in order!\n{task.id} scheduled at {task.scheduled} found at time {time}"
+            f"Schedule not in order!\n{task.id} scheduled at {scheduled} found at time {time}"
         )
-    if not task.scheduled == time:
-        return
+    if not scheduled == time:
+        return None
     # Check for time conflicts
     running = running_tasks[channel]
     if running:
@@ -154,64 +190,102 @@ def accept_task(
         )
 
     # check for register conflicts
-    register_conflict = next(
-        (
-            running[1]
-            for running in running_tasks.values()
-            if running and len(task.registers & running[1].registers) > 0
-        ),
-        None,
-    )
-    if register_conflict:
-        shared_regs = " ".join(
-            r.value for r in task.registers & register_conflict.registers
-        )
+    conflict_mask = task.reg_mask & live_mask
+    if conflict_mask:
+        register_conflict = register_owner[conflict_mask & -conflict_mask]
+        shared_regs = register_names[task.reg_mask & register_conflict.reg_mask]
         raise BadScheduleException(
             f"""Cannot schedule function, register is already in use
 {task.id} and {register_conflict.id} shared registers {shared_regs} at {time}"""
         )
 
     # check for unmet dependencies
-    bad_ordering = next(
-        (depend for depend in task.depends if depend not in completed), None
-    )
-    if bad_ordering:
+    if remaining_deps[task]:
+        bad_ordering = next(d for d in task.depends if d not in completed)
         raise BadScheduleException(
             f"""Dependency not completed, cannot schedule task
 {bad_ordering.id} has not completed at {time}"""
         )
 
     running_tasks[channel] = (time + task.duration, task)
-    solution[channel].pop(0)
+    cursor[channel] += 1
+    return task
 
 
-def simulate_cpu(solution: dict[str, list[Task]], tasklist: list[Task]) -> None:
+def simulate_cpu(
+    solution: dict[str, list[Task]], tasklist: list[Task], schedule: dict[str, int]
+) -> None:
     """
+    `schedule` maps each task id to the time it was scheduled at
     This function throws BadScheduleException, which should be caught by the caller
     """
-    solution = {name: [x for x in l] for (name, l) in solution.items()}
+    cursor: dict[str, int] = {name: 0 for name in solution}
     completed: set[Task] = set()
+    remaining_deps: dict[Task, int] = {t: len(t.depends) for t in tasklist}
+    reverse_deps: dict[Task, list[Task]] = {t: [] for t in tasklist}
+    for t in tasklist:
+        for depend in t.depends:
+            reverse_deps[depend].append(t)
+    live_mask: int = 0
+    register_owner: dict[int, Task] = {}
+    running: int = 0
     time: int = 0
     running_tasks: dict[str, tuple[int, Task] | None] = {
         name: None for name in resource_ids
     }
 
-    unscheduled = [t.id for t in tasklist if t.scheduled == -1]
+    unscheduled = [t.id for t in tasklist if t.id not in schedule]
     if unscheduled:
         raise BadScheduleException(
             f"One or more tasks were not scheduled!\n {unscheduled}"
         )
 
-    while any(len(l) > 0 for l in solution.values()) and time < 30:
+    # Each channel is only revisited when its head task is due, so time jumps
+    # straight between scheduling events. A channel which dispatched at `time`
+    # cannot look at its next task before `time + 1`.
+    events: list[tuple[int, int, str]] = [
+        (max(schedule[solution[channel][0].id], 0), i, channel)
+        for i, channel in enumerate(resource_ids)
+        if solution[channel]
+    ]
+    heapq.heapify(events)
+
+    while events:
+        time = events[0][0]
         # clear completed tasks
         for k, v in running_tasks.items():
+            if not running:
+                break
             if v and v[0] <= time:
                 running_tasks[k] = None
+                running -= 1
                 completed.add(v[1])
-        # add new tasks to list
+                live_mask &= ~v[1].reg_mask
+                for dependent in reverse_deps[v[1]]:
+                    remaining_deps[dependent] -= 1
+        # add new tasks to list, channels due at the same time run in resource order
         # THIS FUNCTION THROWS BadScheduleException
-        for channel in resource_ids:
-            accept_task(channel, solution, time, running_tasks, completed)
-        time += 1
-    if time >= 30:
-        raise Exception("The simulator has entered an inifinite loop")
+        while events and events[0][0] == time:
+            _, i, channel = heapq.heappop(events)
+            task = accept_task(
+                channel,
+                solution,
+                schedule,
+                cursor,
+                time,
+                running_tasks,
+                completed,
+                remaining_deps,
+                live_mask,
+                register_owner,
+            )
+            if task:
+                running += 1
+                live_mask |= task.reg_mask
+                for bit in register_bits.values():
+                    if bit & task.reg_mask:
+                        register_owner[bit] = task
+            if cursor[channel] < len(solution[channel]):
+                head = solution[channel][cursor[channel]]
+                next_time = max(schedule[head.id], time + 1)
+                heapq.heappush(events, (next_time, i, channel))